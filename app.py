@@ -3,22 +3,129 @@ import streamlit as st
 import google.generativeai as genai
 from pathlib import Path
 import tempfile
-import PyPDF2
-from PIL import Image
+import shutil
+import zipfile
+import xml.etree.ElementTree as ET
 import io
-from docx import Document
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional, Tuple, Union, Dict, Any
 import logging
+import re
 from database_helper import DatabaseManager
-import pickle
+from retrieval_helper import chunk_text, normalize_embeddings, top_k_similar, warm_up
+import numpy as np
+
+@st.cache_resource(show_spinner=False)
+def get_db() -> DatabaseManager:
+    """Return the process-wide database manager, kept across reruns and sessions"""
+    return DatabaseManager()
+
 
 # Initialize database manager
-db = DatabaseManager()
+db = get_db()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Retrieval settings for follow-up questions on documents too large to send
+# whole (~4096 tokens, roughly 4 characters per token)
+EMBEDDING_MODEL_NAME = "models/text-embedding-004"
+EMBEDDING_BATCH_SIZE = 100
+RETRIEVAL_MIN_CHARS = 4096 * 4
+RETRIEVAL_TOP_K = 5
+
+# WordprocessingML namespace used by the elements in word/document.xml
+DOCX_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Unambiguous phrases that route a query without asking Gemini. Words such as
+# "class", "example" or "pattern" are everyday OOAD concept vocabulary, so
+# they are left to Gemini, as is anything phrased as a concept question
+CODE_QUERY_RE = re.compile(r'\b(write|show me|give me|generate)\b.*\bcode\b|\bimplement\b|\bsnippet\b')
+DESIGN_QUERY_RE = re.compile(r'\b(design|draw|create)\b.*\b(architecture|uml|diagram)\b')
+CONCEPT_QUERY_RE = re.compile(r'^(what|why|when|explain|define|describe)\b|\bdifference between\b')
+
+# Fenced code block with an optional language hint, e.g. ```java; the hint only
+# counts when it ends the fence line, so ```print(1)``` stays code
+CODE_BLOCK_RE = re.compile(r"```(?:([\w+#.-]+)[ \t]*\n|\n?)(.*?)```", re.DOTALL)
+
+# Prompt for the initial analysis shown when a document is opened
+ANALYSIS_PROMPT = """
+    Analyze this document and provide:
+    1. Brief content summary
+    2. Key topics and concepts identified
+    3. Relevant OOAD principles or patterns found
+    4. Suggested questions for deeper understanding
+    """
+
+# Prompt templates for the specialized agents; only {query} varies per call
+AGENT_PROMPTS = {
+    "concept": """
+        Act as an OOAD expert. Explain the following concept clearly and concisely:
+        {query}
+
+        Provide:
+        1. Clear definition with examples
+        2. Key characteristics and principles
+        3. Real-world applications
+        4. Common misconceptions
+        5. Best practices and pitfalls
+        """,
+
+    "code": """
+        Generate a practical, production-ready implementation for this request:
+        {query}
+
+        Include:
+        1. Complete, working code with error handling
+        2. Step-by-step explanation of the implementation in java
+        3. Best practices and potential pitfalls
+        4. Usage examples and test cases
+        5. Performance considerations
+        """,
+    "design": """
+        Act as a senior software architect. Address this design request:
+        {query}
+
+        Provide:
+        1. Comprehensive system design overview
+        2. Key components and their interactions
+        3. Design patterns and SOLID principles application
+        4. Scalability and maintainability considerations
+        5. Potential challenges and mitigation strategies
+        """
+}
+
+# Image modes sent to Gemini byte-for-byte without decoding and re-encoding
+PASSTHROUGH_IMAGE_MODES = ("RGB", "RGBA", "L")
+
+
+# Heavy document-processing libraries are imported on first use so that
+# startup doesn't pay for file types the user never uploads
+@functools.lru_cache(maxsize=None)
+def _pdf_helper():
+    import pdf_helper
+    return pdf_helper
+
+
+@functools.lru_cache(maxsize=None)
+def _pypdf2():
+    import PyPDF2
+    return PyPDF2
+
+
+@functools.lru_cache(maxsize=None)
+def _pil_image():
+    from PIL import Image
+    return Image
+
+
+@st.cache_resource
+def _analysis_pool() -> ThreadPoolExecutor:
+    """Shared worker threads for initial document analysis, kept across reruns"""
+    return ThreadPoolExecutor(max_workers=2)
+
 
 # Configure Gemini API
 def configure_api():
@@ -31,22 +138,69 @@ def configure_api():
 
 
 def read_image_file(file_path: str) -> Union[bytes, str]:
-    """Read and process image file with error handling"""
+    """Read image file, only re-encoding images Gemini cannot take as-is"""
     try:
-        with Image.open(file_path) as image:
-            # Convert image to RGB if it's not
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            # Create byte stream
+        with _pil_image().open(file_path) as image:
+            # Opening only parses the header, so this check is cheap
+            if image.mode in PASSTHROUGH_IMAGE_MODES:
+                return Path(file_path).read_bytes()
+
+            # Palette/CMYK images are converted to RGB in their original format
+            # so the stored bytes still match the file's mime type
+            image_format = image.format
+            image = image.convert('RGB')
             byte_stream = io.BytesIO()
-            image.save(byte_stream, format='PNG')
-            byte_stream.seek(0)
+            image.save(byte_stream, format=image_format)
             return byte_stream.getvalue()
     except Exception as e:
         logger.error(f"Error processing image: {e}")
         return f"Error processing image: {str(e)}"
 
 
+def get_image_mime_type(file_type: Optional[str]) -> str:
+    """Map an image file extension to its mime type"""
+    if file_type == "png":
+        return "image/png"
+    return "image/jpeg"
+
+
+def read_pdf_content(source: Union[str, bytes]) -> str:
+    """Extract text from a PDF given either a file path or the raw PDF bytes"""
+    try:
+        return _pdf_helper().extract_pdf_text(source)
+    except Exception as e:
+        # Fall back to PyPDF2 for PDFs that MuPDF refuses to open
+        logger.warning(f"PyMuPDF failed to read PDF, falling back to PyPDF2: {e}")
+        pdf_reader = _pypdf2().PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+        return "\n".join(page.extract_text() for page in pdf_reader.pages)
+
+
+def read_docx_paragraph(paragraph: ET.Element) -> str:
+    """Return a w:p element's text the way python-docx's Paragraph.text does"""
+    # Only the paragraph's own runs; nested text boxes are separate paragraphs
+    runs = []
+    for child in paragraph:
+        if child.tag == f"{DOCX_NS}r":
+            runs.append(child)
+        elif child.tag == f"{DOCX_NS}hyperlink":
+            runs.extend(child.findall(f"{DOCX_NS}r"))
+
+    text = []
+    for run in runs:
+        for child in run:
+            if child.tag == f"{DOCX_NS}t":
+                text.append(child.text or "")
+            elif child.tag == f"{DOCX_NS}tab":
+                text.append("\t")
+            elif child.tag == f"{DOCX_NS}cr":
+                text.append("\n")
+            elif child.tag == f"{DOCX_NS}br":
+                # Page and column breaks carry no text, only line breaks do
+                if child.get(f"{DOCX_NS}type", "textWrapping") == "textWrapping":
+                    text.append("\n")
+    return "".join(text)
+
+
 def read_file_content(file_path: str, file_type: str) -> Union[str, bytes]:
     """Read and return the content of different file types with enhanced error handling"""
     try:
@@ -54,15 +208,16 @@ def read_file_content(file_path: str, file_type: str) -> Union[str, bytes]:
             with open(file_path, 'r', encoding='utf-8') as file:
                 return file.read()
         elif file_type == "pdf":
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                return "\n".join(page.extract_text() for page in pdf_reader.pages)
+            return read_pdf_content(file_path)
         elif file_type == "docx":
-            try:
-                doc = Document(file_path)
-                return "\n".join(paragraph.text for paragraph in doc.paragraphs)
-            except ImportError:
-                return "Error: python-docx package is not installed. Please install it using: pip install python-docx"
+            # Read paragraph text straight from the document XML instead of
+            # building python-docx's object model
+            with zipfile.ZipFile(file_path) as docx_file:
+                root = ET.fromstring(docx_file.read("word/document.xml"))
+            # Like python-docx's Document.paragraphs, only top-level body paragraphs
+            body = root.find(f"{DOCX_NS}body")
+            return "\n".join(read_docx_paragraph(paragraph)
+                             for paragraph in body.findall(f"{DOCX_NS}p"))
         elif file_type in ["jpg", "jpeg", "png"]:
             return read_image_file(file_path)
         else:
@@ -79,17 +234,27 @@ def process_uploaded_file(uploaded_file: Any) -> Tuple[Optional[Union[str, bytes
 
     try:
         file_type = uploaded_file.name.split('.')[-1].lower()
+        uploaded_file.seek(0)
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_type}') as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_file_path = tmp_file.name
+        if file_type == "pdf":
+            # PDFs are parsed straight from memory, no temporary file needed
+            try:
+                content = read_pdf_content(uploaded_file.read())
+            except Exception as e:
+                logger.error(f"Error reading file: {e}")
+                content = f"Error reading file: {str(e)}"
+        else:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_type}') as tmp_file:
+                # Stream in 1MB chunks instead of buffering a second copy of the upload
+                shutil.copyfileobj(uploaded_file, tmp_file, length=1024 * 1024)
+                tmp_file_path = tmp_file.name
 
-        content = read_file_content(tmp_file_path, file_type)
+            content = read_file_content(tmp_file_path, file_type)
 
-        try:
-            os.unlink(tmp_file_path)
-        except Exception as e:
-            logger.warning(f"Failed to delete temporary file: {e}")
+            try:
+                os.unlink(tmp_file_path)
+            except Exception as e:
+                logger.warning(f"Failed to delete temporary file: {e}")
 
         if isinstance(content, str) and content.startswith("Error"):
             return content, None, None
@@ -97,6 +262,12 @@ def process_uploaded_file(uploaded_file: Any) -> Tuple[Optional[Union[str, bytes
         # Save to database
         document_id = db.save_document(uploaded_file.name, file_type, content)
 
+        # Start the initial analysis first so it runs while the document is indexed
+        st.session_state.pending_analyses[document_id] = _analysis_pool().submit(
+            _precompute_analysis, document_id, content, file_type
+        )
+        index_document(document_id, content)
+
         return content, file_type, document_id
 
     except Exception as e:
@@ -104,24 +275,43 @@ def process_uploaded_file(uploaded_file: Any) -> Tuple[Optional[Union[str, bytes
         return f"Error processing file: {str(e)}", None, None
 
 
+def _build_gemini_request(prompt: str, context: Optional[Union[str, bytes]], model_name: str,
+                          file_type: Optional[str]) -> Tuple[Any, Any]:
+    """Pick the Gemini model and assemble the request contents for a query"""
+    if isinstance(context, bytes):
+        image = {"mime_type": get_image_mime_type(file_type), "data": context}
+        return genai.GenerativeModel('gemini-pro-vision'), [prompt, image]
+    else:
+        # Keep the context as an unindented prefix so repeated queries on the
+        # same document share a byte-identical prompt prefix (implicit caching)
+        full_prompt = prompt if not context else (
+            f"Context from uploaded file:\n{context}\n\nQuery:\n{prompt}"
+        )
+        return genai.GenerativeModel(model_name), full_prompt
+
+
+def _precompute_analysis(document_id: int, content: Union[str, bytes],
+                         file_type: str) -> Optional[str]:
+    """Run and store the initial document analysis on a background thread"""
+    response = query_gemini_api(ANALYSIS_PROMPT, content, file_type=file_type)
+    if response['status'] != 'success':
+        return None
+
+    try:
+        get_db().save_analysis(document_id, 'initial', response['content'])
+    except Exception as e:
+        # The document may have been deleted while the analysis was running
+        logger.warning(f"Failed to save background analysis: {e}")
+    return response['content']
+
+
 def query_gemini_api(prompt: str, context: Optional[Union[str, bytes]] = None,
-                     model_name: str = "gemini-pro") -> Dict[str, str]:
+                     model_name: str = "gemini-pro",
+                     file_type: Optional[str] = None) -> Dict[str, str]:
     """Query the Gemini API with enhanced error handling and rate limiting"""
     try:
-        if isinstance(context, bytes):
-            model = genai.GenerativeModel('gemini-pro-vision')
-            image = {"mime_type": "image/jpeg", "data": context}  # Or appropriate mime type
-            response = model.generate_content([prompt, image])
-        else:
-            model = genai.GenerativeModel(model_name)
-            full_prompt = prompt if not context else f"""
-            Context from uploaded file:
-            {context}
-
-            Query:
-            {prompt}
-            """
-            response = model.generate_content(full_prompt)
+        model, contents = _build_gemini_request(prompt, context, model_name, file_type)
+        response = model.generate_content(contents)
 
         return {
             'status': 'success',
@@ -135,12 +325,110 @@ def query_gemini_api(prompt: str, context: Optional[Union[str, bytes]] = None,
         }
 
 
+def _stream_text(response: Any, result: Dict[str, Any]):
+    """Yield streamed response text, turning mid-stream failures into an error result"""
+    try:
+        for chunk in response:
+            yield chunk.text
+    except Exception as e:
+        logger.error(f"Gemini API error: {e}")
+        result['status'] = 'error'
+        result['content'] = f"Error communicating with AI model: {str(e)}"
+
+
+def query_gemini_api_stream(prompt: str, context: Optional[Union[str, bytes]] = None,
+                            model_name: str = "gemini-pro",
+                            file_type: Optional[str] = None) -> Dict[str, Any]:
+    """Query the Gemini API, returning the response text as an iterator of chunks
+
+    Errors raised while the stream is read set the result's status to 'error'
+    once the iterator is exhausted.
+    """
+    try:
+        model, contents = _build_gemini_request(prompt, context, model_name, file_type)
+        response = model.generate_content(contents, stream=True)
+
+        result = {'status': 'success'}
+        result['content'] = _stream_text(response, result)
+        return result
+    except Exception as e:
+        logger.error(f"Gemini API error: {e}")
+        return {
+            'status': 'error',
+            'content': f"Error communicating with AI model: {str(e)}"
+        }
+
+
+def index_document(document_id: int, content: Union[str, bytes]):
+    """Split a large text document into chunks and store their embeddings"""
+    if not isinstance(content, str) or len(content) < RETRIEVAL_MIN_CHARS:
+        return
+
+    try:
+        chunks = chunk_text(content)
+        embeddings = []
+        for start in range(0, len(chunks), EMBEDDING_BATCH_SIZE):
+            result = genai.embed_content(
+                model=EMBEDDING_MODEL_NAME,
+                content=chunks[start:start + EMBEDDING_BATCH_SIZE],
+                task_type="retrieval_document"
+            )
+            embeddings.extend(result['embedding'])
+
+        embeddings = normalize_embeddings(embeddings)
+        db.save_chunks(document_id, [(chunk, embedding.tobytes())
+                                     for chunk, embedding in zip(chunks, embeddings)])
+    except Exception as e:
+        # Without chunks, questions fall back to sending the whole document
+        logger.warning(f"Failed to index document for retrieval: {e}")
+
+
+def retrieve_context(document_id: int, query: str) -> Optional[str]:
+    """Return the document chunks most relevant to the query, if indexed"""
+    try:
+        chunks = db.get_chunks(document_id)
+        if not chunks:
+            return None
+
+        result = genai.embed_content(
+            model=EMBEDDING_MODEL_NAME,
+            content=query,
+            task_type="retrieval_query"
+        )
+        query_embedding = normalize_embeddings(result['embedding'])
+        embeddings = np.vstack([np.frombuffer(embedding, dtype=np.float32) for _, embedding in chunks])
+
+        top = top_k_similar(embeddings, query_embedding, RETRIEVAL_TOP_K)
+        return "\n\n".join(chunks[idx][0] for idx in top)
+    except Exception as e:
+        logger.warning(f"Failed to retrieve document context: {e}")
+        return None
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def _route_query(prompt: str) -> str:
+    """Ask Gemini to route a query; errors raise so they are never cached"""
+    response = query_gemini_api(prompt)
+    if response['status'] != 'success':
+        raise RuntimeError(response['content'])
+    return response['content'].strip().lower()
+
+
 def analyze_query(query: str, file_content: Optional[Union[str, bytes]] = None,
                   file_type: Optional[str] = None) -> str:
     """Analyze the query and determine the most appropriate agent"""
+    normalized_query = query.lower().strip()
+
+    # Obvious queries are routed locally without an API round-trip
+    if not CONCEPT_QUERY_RE.search(normalized_query):
+        if CODE_QUERY_RE.search(normalized_query):
+            return "code"
+        if DESIGN_QUERY_RE.search(normalized_query):
+            return "design"
+
     prompt = f"""
     Analyze this query and determine which specialized agent would be most appropriate.
-    Query: {query}
+    Query: {normalized_query}
 
     Choose from:
     1. Concept Clarification Agent - For explaining OOAD concepts, principles, and theoretical questions
@@ -156,67 +444,65 @@ def analyze_query(query: str, file_content: Optional[Union[str, bytes]] = None,
         else:
             prompt += "\nNote: Query includes an image file."
 
-    response = query_gemini_api(prompt)
-    return response['content'].strip().lower() if response['status'] == 'success' else "concept"
+    try:
+        # Cached on the full prompt, so identical queries skip the API call
+        return _route_query(prompt)
+    except Exception as e:
+        logger.warning(f"Query routing failed, defaulting to concept agent: {e}")
+        return "concept"
 
 
 def get_agent_prompt(query: str, agent_type: str) -> str:
     """Generate appropriate prompt based on agent type"""
-    prompts = {
-        "concept": f"""
-        Act as an OOAD expert. Explain the following concept clearly and concisely:
-        {query}
+    return AGENT_PROMPTS.get(agent_type, AGENT_PROMPTS["concept"]).format(query=query)
 
-        Provide:
-        1. Clear definition with examples
-        2. Key characteristics and principles
-        3. Real-world applications
-        4. Common misconceptions
-        5. Best practices and pitfalls
-        """,
-
-        "code": f"""
-        Generate a practical, production-ready implementation for this request:
-        {query}
-
-        Include:
-        1. Complete, working code with error handling
-        2. Step-by-step explanation of the implementation in java
-        3. Best practices and potential pitfalls
-        4. Usage examples and test cases
-        5. Performance considerations
-        """,
-        "design": f"""
-        Act as a senior software architect. Address this design request:
-        {query}
-
-        Provide:
-        1. Comprehensive system design overview
-        2. Key components and their interactions
-        3. Design patterns and SOLID principles application
-        4. Scalability and maintainability considerations
-        5. Potential challenges and mitigation strategies
-        """
-    }
-    return prompts.get(agent_type, prompts["concept"])
 
-
-def display_response(response: Dict[str, str], agent_type: str):
-    """Display the AI response with appropriate formatting"""
+def display_response(response: Dict[str, Any], agent_type: str) -> Optional[str]:
+    """Display the AI response with appropriate formatting and return its text"""
     if response['status'] == 'success':
-        if agent_type == "code" and "```" in response['content']:
-            # Split and display code blocks separately
-            parts = response['content'].split("```")
-            for i, part in enumerate(parts):
-                if i % 2 == 0:  # Non-code parts
-                    if part.strip():
-                        st.markdown(part)
-                else:  # Code parts
-                    st.code(part)
+        content = response['content']
+        if not isinstance(content, str):
+            # Streamed response: render chunks as they arrive
+            placeholder = st.empty()
+            with placeholder.container():
+                content = st.write_stream(content)
+            if response['status'] != 'success':
+                st.error(response['content'])
+                return None
+            if not (agent_type == "code" and "```" in content):
+                return content
+            # Replace the streamed text with the formatted version below
+            placeholder.empty()
+
+        if agent_type == "code" and "```" in content:
+            # Display code blocks separately, using the fence's language hint
+            last_end = 0
+            for match in CODE_BLOCK_RE.finditer(content):
+                text = content[last_end:match.start()]
+                if text.strip():
+                    st.markdown(text)
+                st.code(match.group(2), language=match.group(1))
+                last_end = match.end()
+
+            text = content[last_end:]
+            if text.strip():
+                st.markdown(text)
         else:
-            st.markdown(response['content'])
+            st.markdown(content)
+        return content
     else:
         st.error(response['content'])
+        return None
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _get_document_cached(doc_id: int) -> Optional[Dict[str, Any]]:
+    """Load a document once and keep it in memory across reruns
+
+    Stored documents are never modified and AUTOINCREMENT ids are never reused,
+    so the id alone is a safe cache key.
+    """
+    return db.get_document(doc_id)
 
 
 def document_analyzer_agent():
@@ -225,7 +511,6 @@ def document_analyzer_agent():
 
     # Add back button
     if st.button("← Back to Main Interface"):
-        st.session_state.doc_content = None
         st.session_state.doc_type = None
         st.session_state.file_name = None
         st.session_state.current_doc_id = None
@@ -234,7 +519,7 @@ def document_analyzer_agent():
     # Display document info
     doc_id = st.session_state.get('current_doc_id')
     if doc_id:
-        document = db.get_document(doc_id)
+        document = _get_document_cached(doc_id)
         if document:
             st.info(f"Analyzing: {document['filename']}")
 
@@ -243,16 +528,16 @@ def document_analyzer_agent():
 
             # Get or perform initial analysis
             analysis = db.get_analysis(doc_id, 'initial')
+            pending: Optional[Future] = st.session_state.pending_analyses.get(doc_id)
+            if not analysis and pending is not None:
+                # Wait for the analysis started at upload instead of repeating it
+                with st.spinner("Analyzing document..."):
+                    analysis = pending.result()
+            st.session_state.pending_analyses.pop(doc_id, None)
             if not analysis:
                 with st.spinner("Analyzing document..."):
-                    analyze_prompt = """
-                    Analyze this document and provide:
-                    1. Brief content summary
-                    2. Key topics and concepts identified
-                    3. Relevant OOAD principles or patterns found
-                    4. Suggested questions for deeper understanding
-                    """
-                    response = query_gemini_api(analyze_prompt, document['content'])
+                    response = query_gemini_api(ANALYSIS_PROMPT, document['content'],
+                                                file_type=document['file_type'])
                     if response['status'] == 'success':
                         analysis = response['content']
                         db.save_analysis(doc_id, 'initial', analysis)
@@ -277,14 +562,21 @@ def document_analyzer_agent():
                     from the document. If the answer requires OOAD expertise, include
                     relevant OOAD principles and best practices in the explanation.
                     """
-                    response = query_gemini_api(prompt, document['content'])
+                    # Large documents only send the chunks relevant to the question
+                    context = retrieve_context(doc_id, query)
+                    if context is not None:
+                        response = query_gemini_api_stream(prompt, context)
+                    else:
+                        response = query_gemini_api_stream(prompt, document['content'],
+                                                           file_type=document['file_type'])
 
-                    if response['status'] == 'success':
-                        # Save query and response
-                        db.save_query(doc_id, query, response['content'], 'document_analysis')
+                if response['status'] == 'success':
+                    st.markdown("### Answer")
+                answer = display_response(response, 'document_analysis')
 
-                        st.markdown("### Answer")
-                        st.markdown(response['content'])
+                if answer is not None:
+                    # Save query and response once the stream has finished
+                    db.save_query(doc_id, query, answer, 'document_analysis')
 
 
 def unified_query_interface():
@@ -292,7 +584,7 @@ def unified_query_interface():
     st.header("OOAD Intelligent Assistant")
 
     # Show recent documents
-    recent_docs = db.get_recent_documents()
+    recent_docs, recent_queries = db.get_sidebar_data()
     if recent_docs:
         st.sidebar.markdown("### Recent Documents")
 
@@ -307,8 +599,12 @@ def unified_query_interface():
 
                 # Document button in the main column
                 with col1:
-                    if st.button(f"📄 {filename}", key=f"doc_{doc_id}"):
-                        st.session_state.doc_content = db.get_document(doc_id)['content']
+                    pending = st.session_state.pending_analyses.get(doc_id)
+                    badge = " ⏳" if pending is not None and not pending.done() else ""
+                    if st.button(f"📄 {filename}{badge}", key=f"doc_{doc_id}",
+                                 help="Analyzing…" if badge else None):
+                        # Content is served from the document cache, so record the access here
+                        db.touch_document(doc_id)
                         st.session_state.doc_type = file_type
                         st.session_state.file_name = filename
                         st.session_state.current_doc_id = doc_id
@@ -325,7 +621,6 @@ def unified_query_interface():
             if db.delete_document(st.session_state.delete_document):
                 # If the deleted document was the current document, clear the session state
                 if st.session_state.delete_document == st.session_state.get('current_doc_id'):
-                    st.session_state.doc_content = None
                     st.session_state.doc_type = None
                     st.session_state.file_name = None
                     st.session_state.current_doc_id = None
@@ -335,7 +630,6 @@ def unified_query_interface():
             st.error(f"Failed to delete document: {str(e)}")
 
     # Show recent queries in compact dropdown format
-    recent_queries = db.get_recent_queries()
     if recent_queries:
         st.sidebar.markdown("### Recent Questions")
 
@@ -398,7 +692,6 @@ def unified_query_interface():
             if isinstance(content, str) and content.startswith("Error"):
                 st.error(content)
             else:
-                st.session_state.doc_content = content
                 st.session_state.doc_type = file_type
                 st.session_state.file_name = uploaded_file.name
                 st.session_state.current_doc_id = doc_id
@@ -412,23 +705,23 @@ def unified_query_interface():
     )
 
     if st.button("Get Answer", disabled=not query):
-        with st.spinner("Processing your query..."):
-            try:
+        try:
+            with st.spinner("Processing your query..."):
                 agent_type = analyze_query(query)
                 st.info(f"Query routed to: {agent_type.title()} Agent")
 
                 prompt = get_agent_prompt(query, agent_type)
-                response = query_gemini_api(prompt)
+                response = query_gemini_api_stream(prompt)
 
-                if response['status'] == 'success':
-                    # Save query and response
-                    db.save_query(None, query, response['content'], agent_type)
+            content = display_response(response, agent_type)
 
-                display_response(response, agent_type)
+            if content is not None:
+                # Save query and response once the stream has finished
+                db.save_query(None, query, content, agent_type)
 
-            except Exception as e:
-                logger.error(f"Error in query processing: {e}")
-                st.error(f"An error occurred while processing your query: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error in query processing: {e}")
+            st.error(f"An error occurred while processing your query: {str(e)}")
 
 def main():
     """Main application entry point with improved error handling"""
@@ -440,17 +733,20 @@ def main():
         )
 
         configure_api()
+        warm_up()
 
         # Initialize session state
-        if 'doc_content' not in st.session_state:
-            st.session_state.doc_content = None
+        if 'current_doc_id' not in st.session_state:
+            st.session_state.current_doc_id = None
             st.session_state.doc_type = None
             st.session_state.file_name = None
             st.session_state.delete_document = None
+        if 'pending_analyses' not in st.session_state:
+            st.session_state.pending_analyses = {}
 
         st.title("Intelligent Multi-Agent AI Application for OOAD")
 
-        if st.session_state.doc_content is not None:
+        if st.session_state.get('current_doc_id') is not None:
             document_analyzer_agent()
         else:
             st.markdown("""
@@ -1,24 +1,92 @@
 import sqlite3
-from datetime import datetime
-import json
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, Union, Tuple, List
 import logging
+import threading
+import zstandard as zstd
+
+# Prefix marking zstd-compressed text content; stored images start with their
+# own JPEG/PNG signature and plain text is stored as TEXT, so this can't clash
+COMPRESSED_MAGIC = b'Z'
+
+# Tables holding per-document records; rows are removed together with their
+# document through ON DELETE CASCADE
+CHILD_TABLES = {
+    "document_analysis": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER,
+            analysis_type TEXT NOT NULL,
+            analysis_content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE
+        )
+        """,
+    "queries": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER,
+            query_text TEXT NOT NULL,
+            response_text TEXT NOT NULL,
+            agent_type TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE
+        )
+        """,
+    "document_chunks": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL,
+            chunk_idx INTEGER NOT NULL,
+            chunk_text TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE
+        )
+        """
+}
 
 
 class DatabaseManager:
     def __init__(self, db_path: str = "ooad_assistant.db"):
         """Initialize database connection and create tables if they don't exist"""
         self.db_path = db_path
+        # One long-lived connection shared across Streamlit reruns, which may run
+        # on different threads. Every statement runs under the lock; reads skip the
+        # connection context manager, whose commit() would end another thread's
+        # open transaction
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._compressor = zstd.ZstdCompressor(level=3)
+        self._decompressor = zstd.ZstdDecompressor()
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA mmap_size = 268435456;
+            PRAGMA foreign_keys = ON;
+            """
+        )
         self.setup_database()
 
     def get_connection(self):
-        """Create and return a database connection"""
-        return sqlite3.connect(self.db_path)
+        """Return the shared database connection"""
+        return self._conn
+
+    def _encode_content(self, content: Union[str, bytes]) -> Union[str, bytes]:
+        """Compress text content for storage, leaving binary content untouched"""
+        if isinstance(content, str):
+            return COMPRESSED_MAGIC + self._compressor.compress(content.encode('utf-8'))
+        return content
+
+    def _decode_content(self, content: Union[str, bytes, None]) -> Union[str, bytes, None]:
+        """Reverse _encode_content for values read back from the database"""
+        if isinstance(content, bytes) and content.startswith(COMPRESSED_MAGIC):
+            return self._decompressor.decompress(content[len(COMPRESSED_MAGIC):]).decode('utf-8')
+        return content
 
     def setup_database(self):
         """Create necessary tables if they don't exist"""
-        queries = [
-            """
+        documents_table = """
             CREATE TABLE IF NOT EXISTS documents (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 filename TEXT NOT NULL,
@@ -27,45 +95,69 @@ class DatabaseManager:
                 upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 last_accessed TIMESTAMP
             )
-            """,
             """
-            CREATE TABLE IF NOT EXISTS document_analysis (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                document_id INTEGER,
-                analysis_type TEXT NOT NULL,
-                analysis_content TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (document_id) REFERENCES documents (id)
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS queries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                document_id INTEGER,
-                query_text TEXT NOT NULL,
-                response_text TEXT NOT NULL,
-                agent_type TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (document_id) REFERENCES documents (id)
-            )
+        # Indexes backing the sidebar's recent lists and the analysis lookup
+        indexes = [
+            "CREATE INDEX IF NOT EXISTS idx_docs_last_accessed ON documents (last_accessed DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_queries_created_at ON queries (created_at DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_queries_doc_id ON queries (document_id, created_at DESC)",
             """
+            CREATE INDEX IF NOT EXISTS idx_analysis_lookup
+            ON document_analysis (document_id, analysis_type, created_at DESC)
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_chunks_doc_id ON document_chunks (document_id, chunk_idx)"
         ]
 
-        with self.get_connection() as conn:
-            for query in queries:
-                conn.execute(query)
+        with self._lock, self.get_connection() as conn:
+            conn.execute(documents_table)
+            for table, schema in CHILD_TABLES.items():
+                conn.execute(schema.format(table=table))
+                self._migrate_cascade(conn, table, schema)
+            for index in indexes:
+                conn.execute(index)
+
+    def _migrate_cascade(self, conn: sqlite3.Connection, table: str, schema: str):
+        """Rebuild a child table created before ON DELETE CASCADE was added"""
+        foreign_keys = conn.execute(f"PRAGMA foreign_key_list({table})").fetchall()
+        # Column 6 of foreign_key_list is the ON DELETE action
+        if all(fk[6] == "CASCADE" for fk in foreign_keys):
+            return
+
+        logging.info(f"Migrating {table} to cascade on document deletion")
+        columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA table_info({table})"))
+        # foreign_keys can't be toggled inside a transaction
+        conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            conn.execute("BEGIN")
+            conn.execute(schema.format(table=f"{table}_new"))
+            # Orphaned rows would violate the new constraint, so drop them
+            conn.execute(
+                f"""
+                INSERT INTO {table}_new ({columns})
+                SELECT {columns} FROM {table}
+                WHERE document_id IS NULL OR document_id IN (SELECT id FROM documents)
+                """
+            )
+            conn.execute(f"DROP TABLE {table}")
+            conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON")
 
     def save_document(self, filename: str, file_type: str, content: Union[str, bytes]) -> int:
         """Save document to database and return document ID"""
         try:
-            with self.get_connection() as conn:
+            with self._lock, self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
                     INSERT INTO documents (filename, file_type, content, upload_date, last_accessed)
                     VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
                     """,
-                    (filename, file_type, content)
+                    (filename, file_type, self._encode_content(content))
                 )
                 return cursor.lastrowid
         except Exception as e:
@@ -75,29 +167,38 @@ class DatabaseManager:
     def get_document(self, document_id: int) -> Optional[Dict[str, Any]]:
         """Retrieve document and update last_accessed timestamp"""
         try:
-            with self.get_connection() as conn:
+            with self._lock, self.get_connection() as conn:
                 cursor = conn.cursor()
+                # Touch and fetch in one statement; the timestamp is only rewritten
+                # once a minute so repeated reruns don't each cause a write
                 cursor.execute(
                     """
-                    SELECT id, filename, file_type, content, upload_date, last_accessed
-                    FROM documents WHERE id = ?
+                    UPDATE documents SET last_accessed = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                    AND (last_accessed IS NULL OR last_accessed < datetime('now', '-60 seconds'))
+                    RETURNING id, filename, file_type, content, upload_date, last_accessed
                     """,
                     (document_id,)
                 )
                 result = cursor.fetchone()
 
-                if result:
-                    # Update last accessed timestamp
+                if not result:
+                    # Recently accessed (or missing), nothing to update
                     cursor.execute(
-                        "UPDATE documents SET last_accessed = CURRENT_TIMESTAMP WHERE id = ?",
+                        """
+                        SELECT id, filename, file_type, content, upload_date, last_accessed
+                        FROM documents WHERE id = ?
+                        """,
                         (document_id,)
                     )
+                    result = cursor.fetchone()
 
+                if result:
                     return {
                         'id': result[0],
                         'filename': result[1],
                         'file_type': result[2],
-                        'content': result[3],
+                        'content': self._decode_content(result[3]),
                         'upload_date': result[4],
                         'last_accessed': result[5]
                     }
@@ -106,10 +207,22 @@ class DatabaseManager:
             logging.error(f"Error retrieving document: {e}")
             raise
 
+    def touch_document(self, document_id: int):
+        """Update a document's last_accessed timestamp without reading its content"""
+        try:
+            with self._lock, self.get_connection() as conn:
+                conn.execute(
+                    "UPDATE documents SET last_accessed = CURRENT_TIMESTAMP WHERE id = ?",
+                    (document_id,)
+                )
+        except Exception as e:
+            logging.error(f"Error updating document access time: {e}")
+            raise
+
     def save_analysis(self, document_id: int, analysis_type: str, analysis_content: str) -> int:
         """Save document analysis results"""
         try:
-            with self.get_connection() as conn:
+            with self._lock, self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -126,8 +239,8 @@ class DatabaseManager:
     def get_analysis(self, document_id: int, analysis_type: str) -> Optional[str]:
         """Retrieve latest analysis for a document"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
+            with self._lock:
+                cursor = self.get_connection().cursor()
                 cursor.execute(
                     """
                     SELECT analysis_content FROM document_analysis
@@ -142,11 +255,45 @@ class DatabaseManager:
             logging.error(f"Error retrieving analysis: {e}")
             raise
 
+    def save_chunks(self, document_id: int, chunks: List[Tuple[str, bytes]]):
+        """Save text chunks and their embeddings for a document"""
+        try:
+            with self._lock, self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN")
+                cursor.executemany(
+                    """
+                    INSERT INTO document_chunks (document_id, chunk_idx, chunk_text, embedding)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    [(document_id, idx, text, embedding) for idx, (text, embedding) in enumerate(chunks)]
+                )
+        except Exception as e:
+            logging.error(f"Error saving chunks: {e}")
+            raise
+
+    def get_chunks(self, document_id: int) -> list:
+        """Retrieve all text chunks and embeddings for a document in order"""
+        try:
+            with self._lock:
+                cursor = self.get_connection().cursor()
+                cursor.execute(
+                    """
+                    SELECT chunk_text, embedding FROM document_chunks
+                    WHERE document_id = ? ORDER BY chunk_idx
+                    """,
+                    (document_id,)
+                )
+                return cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Error retrieving chunks: {e}")
+            raise
+
     def save_query(self, document_id: Optional[int], query_text: str,
                    response_text: str, agent_type: str) -> int:
         """Save query and response"""
         try:
-            with self.get_connection() as conn:
+            with self._lock, self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -163,7 +310,7 @@ class DatabaseManager:
     def delete_query(self, query_id: int) -> bool:
         """Delete a query from the database"""
         try:
-            with self.get_connection() as conn:
+            with self._lock, self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     "DELETE FROM queries WHERE id = ?",
@@ -177,8 +324,8 @@ class DatabaseManager:
     def get_recent_queries(self, document_id: Optional[int] = None, limit: int = 5) -> list:
         """Retrieve recent queries for a document or all recent queries"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
+            with self._lock:
+                cursor = self.get_connection().cursor()
                 if document_id:
                     cursor.execute(
                         """
@@ -204,8 +351,8 @@ class DatabaseManager:
     def get_recent_documents(self, limit: int = 5) -> list:
         """Retrieve recently accessed documents"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
+            with self._lock:
+                cursor = self.get_connection().cursor()
                 cursor.execute(
                     """
                     SELECT id, filename, file_type, upload_date, last_accessed
@@ -218,15 +365,16 @@ class DatabaseManager:
             logging.error(f"Error retrieving recent documents: {e}")
             raise
 
+    def get_sidebar_data(self, limit: int = 5) -> Tuple[list, list]:
+        """Retrieve recent documents and recent queries on the shared connection"""
+        return self.get_recent_documents(limit), self.get_recent_queries(limit=limit)
+
     def delete_document(self, document_id: int) -> bool:
         """Delete a document and all related records from the database"""
         try:
-            with self.get_connection() as conn:
+            with self._lock, self.get_connection() as conn:
                 cursor = conn.cursor()
-                # Delete related records first
-                cursor.execute("DELETE FROM document_analysis WHERE document_id = ?", (document_id,))
-                cursor.execute("DELETE FROM queries WHERE document_id = ?", (document_id,))
-                # Delete the document
+                # Analyses, queries and chunks are removed by ON DELETE CASCADE
                 cursor.execute("DELETE FROM documents WHERE id = ?", (document_id,))
                 return cursor.rowcount > 0
         except Exception as e:
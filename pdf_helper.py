@@ -0,0 +1,85 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Union
+
+import fitz
+
+# PDFs with more pages than this are split across worker processes; for
+# smaller files the process start-up cost outweighs the gain
+PARALLEL_PAGE_THRESHOLD = 5
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _open_pdf(source: Union[str, bytes]) -> fitz.Document:
+    """Open a PDF from either a file path or raw bytes"""
+    if isinstance(source, bytes):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def _extract_pages(source: Union[str, bytes], start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) inside a worker process"""
+    doc = _open_pdf(source)
+    try:
+        return [doc[page_idx].get_text("text") for page_idx in range(start, stop)]
+    finally:
+        doc.close()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Return the shared process pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking the multi-threaded Streamlit server is unsafe, so spawn workers
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool(broken_pool: ProcessPoolExecutor):
+    """Discard a pool whose worker died so the next call starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is broken_pool:
+            _pool = None
+    broken_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pdf_text(source: Union[str, bytes]) -> str:
+    """Extract text from a PDF, parallelizing across pages for larger documents"""
+    doc = _open_pdf(source)
+    try:
+        page_count = doc.page_count
+        if page_count <= PARALLEL_PAGE_THRESHOLD:
+            return "\n".join(page.get_text("text") for page in doc)
+    finally:
+        doc.close()
+
+    # One contiguous page range per worker, so the PDF is only sent to each
+    # worker once instead of once per page
+    workers = min(os.cpu_count() or 1, page_count)
+    pages_per_worker = -(-page_count // workers)
+    # A worker can die on a malformed page; retry once on a fresh pool, then let
+    # the caller fall back rather than risk the crash in the server process
+    for attempt in range(2):
+        pool = get_pool()
+        try:
+            futures = [
+                pool.submit(_extract_pages, source, start, min(start + pages_per_worker, page_count))
+                for start in range(0, page_count, pages_per_worker)
+            ]
+            texts = []
+            for future in futures:
+                texts.extend(future.result())
+            return "\n".join(texts)
+        except BrokenProcessPool as e:
+            logging.warning(f"PDF worker pool broke (attempt {attempt + 1}): {e}")
+            _reset_pool(pool)
+    raise BrokenProcessPool("PDF text extraction workers keep failing")
@@ -0,0 +1,89 @@
+from typing import List
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Gemini has no local tokenizer, so token counts are approximated at roughly
+# 4 characters per token
+CHARS_PER_TOKEN = 4
+CHUNK_TOKENS = 512
+CHUNK_OVERLAP_TOKENS = 64
+
+
+def chunk_text(text: str, chunk_tokens: int = CHUNK_TOKENS,
+               overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Split text into overlapping chunks, preferring to break on whitespace"""
+    chunk_size = chunk_tokens * CHARS_PER_TOKEN
+    overlap = overlap_tokens * CHARS_PER_TOKEN
+    chunks = []
+    start = 0
+
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # Back up to the last whitespace so words are not cut in half
+            split_at = text.rfind(" ", start + overlap + 1, end)
+            newline_at = text.rfind("\n", start + overlap + 1, end)
+            split_at = max(split_at, newline_at)
+            if split_at != -1:
+                end = split_at
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = end - overlap
+
+    return chunks
+
+
+def normalize_embeddings(embeddings) -> np.ndarray:
+    """Return embeddings as a float32 array of unit-length rows"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _dot_scores(embeddings, query_embedding):
+        """Score every row against the query, one row per thread"""
+        scores = np.empty(embeddings.shape[0], dtype=np.float32)
+        for row in numba.prange(embeddings.shape[0]):
+            total = np.float32(0.0)
+            for col in range(embeddings.shape[1]):
+                total += embeddings[row, col] * query_embedding[col]
+            scores[row] = total
+        return scores
+else:
+    def _dot_scores(embeddings, query_embedding):
+        """Score every row against the query"""
+        return embeddings @ query_embedding
+
+
+def warm_up():
+    """Compile the similarity kernel ahead of the first real query"""
+    embeddings = np.ones((2, 8), dtype=np.float32)
+    _dot_scores(embeddings, embeddings[0])
+
+
+def top_k_similar(embeddings: np.ndarray, query_embedding: np.ndarray, k: int) -> np.ndarray:
+    """Return indices of the k rows most similar to the query, best first
+
+    Both inputs must already be L2-normalized, so cosine similarity is a
+    plain dot product.
+    """
+    k = min(k, len(embeddings))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+
+    scores = _dot_scores(np.ascontiguousarray(embeddings, dtype=np.float32),
+                         np.ascontiguousarray(query_embedding, dtype=np.float32))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]